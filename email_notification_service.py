@@ -28,45 +28,265 @@ For marketing template:
 - COMPANY_NAME: Company name
 - MARKETING_TEAM_EMAIL: Marketing team email address
 - USERS_JSON: JSON string containing user data
+
+Batch mode:
+- BATCH_MODE: 'true' to read notifications as JSON Lines from stdin, one
+  object per line mapping the template variables above to their values
+- SMTP_POOL_SIZE: Number of SMTP connections, and so notifications, in flight
+  at once (default: 4)
+- SMTP_MAX_MESSAGES_PER_CONN: Messages sent before an SMTP connection is
+  recycled (default: 10000)
+- SMTP_TIMEOUT: SMTP socket timeout in seconds (default: 30)
+- SMTP_MAX_RETRIES: Retries after a transient (4xx) SMTP error (default: 3)
+- SMTP_RETRY_DELAY: Initial retry delay in seconds, doubled on each retry
+  (default: 1)
 """
 
 import os
-import json
+import sys
 import smtplib
 import asyncio
+import base64
 import logging
-import hashlib
 import uuid
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from typing import Dict, Any, List
-from jinja2 import Environment, FileSystemLoader
-import nats
+from functools import lru_cache
+from typing import Dict, Any, BinaryIO, Iterable, Iterator, Optional
+import orjson
+
+# nats, jinja2 and hashlib are imported where they're first needed so that
+# importing this module (e.g. the container health check) stays cheap
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Template types supported by the service
+TEMPLATE_TYPES = ('welcome', 'marketing')
+
+# Per-template template files, email subjects and NATS event types
+TEMPLATE_FILES = {
+    'welcome': 'welcome_email.html',
+    'marketing': 'marketing_notification.html'
+}
+EMAIL_SUBJECTS = {
+    'welcome': 'Welcome to Knapscen!',
+    'marketing': 'New Company Onboarded - Marketing Notification'
+}
+NATS_EVENT_SUBJECTS = {
+    'welcome': 'disco.knapscen.email.welcome.sent',
+    'marketing': 'disco.knapscen.email.marketing.notified'
+}
+
+# Environment variables consumed by the service; snapshotted once per instance
+ENV_VARS = (
+    'EMAIL_TEMPLATE', 'SMTP_SERVER', 'SMTP_PORT', 'SMTP_USER', 'SMTP_PASS',
+    'NATS_SERVER', 'NATS_SUBJECT', 'NATS_USER', 'NATS_PASSWORD',
+    'USER_NAME', 'USER_EMAIL', 'USER_ROLE', 'COMPANY_NAME',
+    'MARKETING_TEAM_EMAIL', 'USERS_JSON', 'SUBSCRIPTION_TIER', 'NEXT_ACTIONS',
+    'BATCH_MODE', 'SMTP_POOL_SIZE', 'SMTP_MAX_MESSAGES_PER_CONN', 'SMTP_TIMEOUT',
+    'SMTP_MAX_RETRIES', 'SMTP_RETRY_DELAY'
+)
+
+# SMTP reply codes meaning the server can't take the message right now
+TRANSIENT_SMTP_CODES = frozenset({421, 450, 451, 452})
+
+# Environment variable values keyed by name
+EnvSnapshot = Dict[str, Optional[str]]
+
+# Per-notification variables a batch job may override
+JOB_VARS = (
+    'EMAIL_TEMPLATE', 'USER_NAME', 'USER_EMAIL', 'USER_ROLE', 'COMPANY_NAME',
+    'MARKETING_TEAM_EMAIL', 'USERS_JSON', 'SUBSCRIPTION_TIER', 'NEXT_ACTIONS'
+)
+
+
+@lru_cache(maxsize=1024)
+def _hash_subject(key: str) -> str:
+    """Return the short CloudEvents subject derived from a stable key."""
+    import hashlib
+    
+    return hashlib.sha256(key.encode()).hexdigest()[:8]
+
+
+def _job_env_value(value: Any) -> Optional[str]:
+    """Convert a batch job value to the string an environment variable would hold.
+    
+    null means unset, and arrays/objects (e.g. NEXT_ACTIONS) are JSON-encoded.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return orjson.dumps(value).decode()
+    return str(value)
+
+
+def _is_transient_smtp_error(error: smtplib.SMTPException) -> bool:
+    """Return True if an SMTP error is temporary and the send is worth retrying."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(
+            code in TRANSIENT_SMTP_CODES for code, _ in error.recipients.values()
+        )
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code in TRANSIENT_SMTP_CODES
+
+
+class PipeliningSMTP(smtplib.SMTP):
+    """SMTP client that pipelines the mail envelope when the server allows it.
+    
+    If the server advertises PIPELINING (RFC 2920), MAIL, RCPT and DATA are
+    flushed in a single write and their replies read back in order, instead
+    of waiting a round trip for each command. Otherwise the stock lock-step
+    exchange from smtplib is used.
+    """
+    
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+        self.ehlo_or_helo_if_needed()
+        if (not self.has_extn('pipelining')
+                or any(option.lower() == 'smtputf8' for option in mail_options)):
+            return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+        
+        if isinstance(msg, str):
+            msg = smtplib._fix_eols(msg).encode('ascii')
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        
+        mail_opts = list(mail_options)
+        if self.has_extn('size'):
+            mail_opts.insert(0, f"size={len(msg)}")
+        mail_args = ''.join(f" {option}" for option in mail_opts)
+        rcpt_args = ''.join(f" {option}" for option in rcpt_options)
+        commands = [f"mail FROM:{smtplib.quoteaddr(from_addr)}{mail_args}"]
+        commands += [f"rcpt TO:{smtplib.quoteaddr(addr)}{rcpt_args}" for addr in to_addrs]
+        commands.append('data')
+        if any('\r' in command or '\n' in command for command in commands):
+            raise ValueError("command arguments contain prohibited newline characters")
+        
+        # Send the whole envelope at once, then collect every reply in order
+        self.send(''.join(f"{command}\r\n" for command in commands))
+        (mail_code, mail_resp), *rcpt_replies, (data_code, data_resp) = [
+            self.getreply() for _ in commands
+        ]
+        
+        senderrs = {
+            addr: (code, resp)
+            for addr, (code, resp) in zip(to_addrs, rcpt_replies)
+            if code not in (250, 251)
+        }
+        if mail_code != 250 or len(senderrs) == len(to_addrs) or data_code != 354:
+            codes = [mail_code, data_code] + [code for code, _ in rcpt_replies]
+            if 421 in codes:
+                self.close()
+            else:
+                if data_code == 354:
+                    # The server is waiting for a body we won't send; end it empty
+                    self.send(b".\r\n")
+                    self.getreply()
+                self._rset()
+            if mail_code != 250:
+                raise smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr)
+            if len(senderrs) == len(to_addrs):
+                raise smtplib.SMTPRecipientsRefused(senderrs)
+            raise smtplib.SMTPDataError(data_code, data_resp)
+        
+        body = smtplib._quote_periods(msg)
+        if not body.endswith(b"\r\n"):
+            body += b"\r\n"
+        self.send(body + b".\r\n")
+        code, resp = self.getreply()
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return senderrs
+
+
+@dataclass
+class PooledSmtp:
+    """An SMTP pool slot: a lazily opened connection and the messages sent on it."""
+    connection: Optional[PipeliningSMTP] = None
+    msg_count: int = 0
+
 
 class EmailNotificationService:
     """Service for sending templated emails and publishing NATS events."""
     
     def __init__(self):
-        self.smtp_server = os.getenv('SMTP_SERVER')
-        self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        self.smtp_user = os.getenv('SMTP_USER')
-        self.smtp_pass = os.getenv('SMTP_PASS')
-        self.nats_server = os.getenv('NATS_SERVER')
-        self.nats_subject = os.getenv('NATS_SUBJECT')
-        self.nats_user = os.getenv('NATS_USER')
-        self.nats_password = os.getenv('NATS_PASSWORD')
+        # Environment variables don't change within a process, so read them once
+        self._env = {var: os.environ.get(var) for var in ENV_VARS}
+        
+        self.smtp_server = self._env['SMTP_SERVER']
+        self.smtp_port = int(self._env['SMTP_PORT'] or '587')
+        self.smtp_user = self._env['SMTP_USER']
+        self.smtp_pass = self._env['SMTP_PASS']
+        self.nats_server = self._env['NATS_SERVER']
+        self.nats_subject = self._env['NATS_SUBJECT']
+        self.nats_user = self._env['NATS_USER']
+        self.nats_password = self._env['NATS_PASSWORD']
+        self.batch_mode = (self._env['BATCH_MODE'] or '').lower() == 'true'
+        self.smtp_pool_size = max(1, int(self._env['SMTP_POOL_SIZE'] or '4'))
+        self.smtp_max_messages_per_conn = int(self._env['SMTP_MAX_MESSAGES_PER_CONN'] or '10000')
+        self.smtp_timeout = float(self._env['SMTP_TIMEOUT'] or '30')
+        self.smtp_max_retries = max(0, int(self._env['SMTP_MAX_RETRIES'] or '3'))
+        self.smtp_retry_delay = float(self._env['SMTP_RETRY_DELAY'] or '1')
         
         # Validate required environment variables
         self._validate_env_vars()
         
-        # Initialize Jinja2 environment
-        self.jinja_env = Environment(loader=FileSystemLoader('templates'))
+        # Decode the marketing template's JSON payload once, not per notification
+        self._next_actions = (
+            self._parse_next_actions(self._env['NEXT_ACTIONS'])
+            if self._env['EMAIL_TEMPLATE'] == 'marketing' else None
+        )
+        
+        # Initialize Jinja2 environment; compiled templates are cached on disk
+        # across restarts and never re-checked for changes within a process
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+        
+        self.jinja_env = Environment(
+            loader=FileSystemLoader('templates'),
+            bytecode_cache=FileSystemBytecodeCache(),
+            auto_reload=False
+        )
+        self._templates = {
+            template_type: self.jinja_env.get_template(self._get_template_filename(template_type))
+            for template_type in TEMPLATE_TYPES
+        }
+        
+        # Constant MIME headers per template; only the encoding, To and body
+        # vary per message
+        self._mime_prefix = {
+            template_type: (
+                f"From: {self.smtp_user}\r\n"
+                f"Subject: {self._get_email_subject(template_type)}\r\n"
+                "MIME-Version: 1.0\r\n"
+                "Content-Type: text/html; charset=utf-8\r\n"
+            )
+            for template_type in TEMPLATE_TYPES
+        }
+        
+        # Invariant CloudEvent attributes per template, and whole events
+        # (minus id and time) for the process environment, built on first use
+        self._ce_base = {
+            template_type: {
+                'specversion': '1.0',
+                'type': self._get_nats_event_subject(template_type),
+                'source': 'knapscen.disco'
+            }
+            for template_type in TEMPLATE_TYPES
+        }
+        self._ce_cache = {}
+        
+        # Pool of SMTP connections and a shared NATS connection, all opened
+        # lazily and reused across messages. Slots start empty; LIFO order
+        # hands out the most recently used (already connected) slot first.
+        self._smtp_pool = asyncio.LifoQueue()
+        for _ in range(self.smtp_pool_size):
+            self._smtp_pool.put_nowait(PooledSmtp())
+        self._nc = None
+        self._nc_lock = asyncio.Lock()
     
     def _validate_env_vars(self):
         """Validate that all required environment variables are set."""
@@ -75,81 +295,139 @@ class EmailNotificationService:
             'NATS_SERVER', 'NATS_SUBJECT', 'NATS_USER', 'NATS_PASSWORD'
         ]
         
-        missing_vars = [var for var in required_vars if not os.getenv(var)]
+        missing_vars = [var for var in required_vars if not self._env[var]]
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
     
-    def _get_template_context(self, template_type: str) -> Dict[str, Any]:
+    @staticmethod
+    def _parse_next_actions(value: Optional[str]) -> Any:
+        """Decode the NEXT_ACTIONS JSON array, treating an unset value as empty."""
+        return orjson.loads(value) if value else []
+    
+    def _get_template_context(self, template_type: str, env: Optional[EnvSnapshot] = None) -> Dict[str, Any]:
         """Get template context based on template type."""
+        env = self._env if env is None else env
         if template_type == 'welcome':
             return {
-                'user_name': os.getenv('USER_NAME'),
-                'user_email': os.getenv('USER_EMAIL'),
-                'company_name': os.getenv('COMPANY_NAME'),
-                'user_role': os.getenv('USER_ROLE')
+                'user_name': env['USER_NAME'],
+                'user_email': env['USER_EMAIL'],
+                'company_name': env['COMPANY_NAME'],
+                'user_role': env['USER_ROLE']
             }
-        elif template_type == 'marketing':        
+        elif template_type == 'marketing':
+            # Reuse the decoded payload unless a batch job supplied its own
+            next_actions = self._next_actions
+            if next_actions is None or env['NEXT_ACTIONS'] is not self._env['NEXT_ACTIONS']:
+                next_actions = self._parse_next_actions(env['NEXT_ACTIONS'])
             return {
-                'company_name': os.getenv('COMPANY_NAME'),
-                'marketing_team_email': os.getenv('MARKETING_TEAM_EMAIL'),
-                'subscription_tier': os.getenv('SUBSCRIPTION_TIER'),
-                'next_actions': json.loads(os.getenv('NEXT_ACTIONS'))
+                'company_name': env['COMPANY_NAME'],
+                'marketing_team_email': env['MARKETING_TEAM_EMAIL'],
+                'subscription_tier': env['SUBSCRIPTION_TIER'],
+                'next_actions': next_actions
             }
         else:
             raise ValueError(f"Unknown template type: {template_type}")
     
     def _get_template_filename(self, template_type: str) -> str:
         """Get template filename based on template type."""
-        template_map = {
-            'welcome': 'welcome_email.html',
-            'marketing': 'marketing_notification.html'
-        }
-        return template_map.get(template_type, f'{template_type}_email.html')
+        return TEMPLATE_FILES[template_type]
     
     def _get_email_subject(self, template_type: str) -> str:
         """Get email subject based on template type."""
-        subject_map = {
-            'welcome': 'Welcome to Knapscen!',
-            'marketing': 'New Company Onboarded - Marketing Notification'
-        }
-        return subject_map.get(template_type, 'Notification')
+        return EMAIL_SUBJECTS[template_type]
     
-    def _get_recipient_email(self, template_type: str) -> str:
+    def _get_recipient_email(self, template_type: str, env: Optional[EnvSnapshot] = None) -> str:
         """Get recipient email based on template type."""
+        env = self._env if env is None else env
         if template_type == 'welcome':
-            return os.getenv('USER_EMAIL')
+            return env['USER_EMAIL']
         elif template_type == 'marketing':
-            return os.getenv('MARKETING_TEAM_EMAIL')
+            return env['MARKETING_TEAM_EMAIL']
         else:
             raise ValueError(f"Unknown template type: {template_type}")
       
-    def send_email(self, template_type: str) -> bool:
+    def _connect_smtp(self) -> PipeliningSMTP:
+        """Open a new SMTP connection, upgrading to TLS when offered, and log in."""
+        server = PipeliningSMTP(self.smtp_server, self.smtp_port, timeout=self.smtp_timeout)
+        server.ehlo()
+        if server.has_extn('starttls'):
+            server.starttls()
+            server.ehlo()
+        server.login(self.smtp_user, self.smtp_pass)
+        return server
+    
+    @staticmethod
+    def _close_smtp(server: PipeliningSMTP) -> None:
+        """Close an SMTP connection, politely if the server is still there."""
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+    
+    def _build_message(self, template_type: str, recipient: str, html_content: str) -> str:
+        """Assemble a raw MIME message from the template's pre-built headers."""
+        if html_content.isascii():
+            encoding, body = '7bit', html_content
+        else:
+            encoding, body = 'base64', base64.encodebytes(html_content.encode('utf-8')).decode('ascii')
+        return (
+            f"{self._mime_prefix[template_type]}"
+            f"Content-Transfer-Encoding: {encoding}\r\n"
+            f"To: {recipient}\r\n"
+            f"\r\n"
+            f"{body}"
+        )
+    
+    def _deliver(self, slot: PooledSmtp, recipient: str, msg: str) -> None:
+        """Send a message over a pooled connection, (re)connecting if needed.
+        
+        Connections are recycled after SMTP_MAX_MESSAGES_PER_CONN messages,
+        before providers start throttling or dropping long-lived sessions.
+        """
+        if slot.connection is None:
+            slot.connection, slot.msg_count = self._connect_smtp(), 0
+        try:
+            slot.connection.sendmail(self.smtp_user, [recipient], msg)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+            slot.connection, slot.msg_count = self._connect_smtp(), 0
+            slot.connection.sendmail(self.smtp_user, [recipient], msg)
+        
+        slot.msg_count += 1
+        if slot.msg_count >= self.smtp_max_messages_per_conn:
+            self._close_smtp(slot.connection)
+            slot.connection, slot.msg_count = None, 0
+    
+    async def send_email(self, template_type: str, env: Optional[EnvSnapshot] = None) -> bool:
         """Send email based on template type."""
         try:
             # Get template context and configuration
-            context = self._get_template_context(template_type)
-            template_filename = self._get_template_filename(template_type)
-            subject = self._get_email_subject(template_type)
-            recipient = self._get_recipient_email(template_type)
+            context = self._get_template_context(template_type, env)
+            recipient = self._get_recipient_email(template_type, env)
             
-            # Load and render template
-            template = self.jinja_env.get_template(template_filename)
-            html_content = template.render(**context)
+            # Render the pre-loaded template
+            html_content = self._templates[template_type].render(**context)
             
             # Create email message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.smtp_user
-            msg['To'] = recipient
-            msg['Subject'] = subject
-            
-            # Add HTML content
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
+            msg = self._build_message(template_type, recipient, html_content)
             
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.login(self.smtp_user, self.smtp_pass)
-                server.send_message(msg)
+            # Send email over a pooled connection in a worker thread so the SMTP
+            # exchange doesn't block the event loop; back off and retry on
+            # transient errors, giving the connection back while waiting
+            for attempt in range(self.smtp_max_retries + 1):
+                slot = await self._smtp_pool.get()
+                delivery = asyncio.ensure_future(asyncio.to_thread(self._deliver, slot, recipient, msg))
+                # Only hand the slot back once the thread is done with it, even
+                # if this send is cancelled, so close() never closes a busy connection
+                delivery.add_done_callback(lambda _, slot=slot: self._smtp_pool.put_nowait(slot))
+                try:
+                    await asyncio.shield(delivery)
+                    break
+                except smtplib.SMTPException as e:
+                    if attempt == self.smtp_max_retries or not _is_transient_smtp_error(e):
+                        raise
+                    delay = self.smtp_retry_delay * 2 ** attempt
+                    logger.warning(f"Transient SMTP error sending to {recipient}, retrying in {delay:g}s: {e}")
+                await asyncio.sleep(delay)
             
             logger.info(f"Email sent successfully to {recipient} using {template_type} template")
             return True
@@ -158,84 +436,88 @@ class EmailNotificationService:
             logger.error(f"Failed to send email: {e}")
             return False
     
-    def _generate_cloud_event(self, template_type: str) -> Dict[str, Any]:
-        """Generate a CloudEvents-compliant event payload."""
+    def _get_nats_event_subject(self, template_type: str) -> str:
+        """Get CloudEvents type of the NATS event based on template type."""
+        return NATS_EVENT_SUBJECTS[template_type]
+    
+    def _build_cloud_event(self, template_type: str, env: EnvSnapshot) -> Dict[str, Any]:
+        """Build the per-notification part of a CloudEvent: subject and data."""
         # Get template-specific data
-        context = self._get_template_context(template_type)
-        
-        # Generate event type based on template
-        event_type_map = {
-            'welcome': 'disco.knapscen.email.welcome.sent',
-            'marketing': 'disco.knapscen.email.marketing.notified'
-        }
-        event_type = event_type_map.get(template_type, f'disco.knapscen.email.{template_type}.sent')
+        context = self._get_template_context(template_type, env)
         
-        ceSubject = ""
-
+        # Subject and data payload based on template type; unknown types
+        # were already rejected by _get_template_context
         if template_type == 'welcome':
             user_email = context.get('user_email') or context.get('marketing_team_email', 'unknown@example.com')
-            email_hash = hashlib.sha256(user_email.encode()).hexdigest()
-            ceSubject = email_hash[:8]
-        elif template_type == 'marketing':
-            customer_name = context.get('company_name')
-            customer_hash = hashlib.sha256(customer_name.encode()).hexdigest()
-            ceSubject = customer_hash[:8]
-        # Generate ID and subject from user email hash
-        
-        # Generate unique event ID
-        event_id = str(uuid.uuid4())[:8]
-        
-        # Current timestamp in ISO format
-        current_time = datetime.now(timezone.utc).isoformat()
-        
-        # Prepare data payload based on template type
-        if template_type == 'welcome':
+            ceSubject = _hash_subject(user_email)
             data = {
                 'customer_name': context.get('company_name'),
                 'user_name': context.get('user_name'),
                 'user_email': context.get('user_email'),
                 'user_role': context.get('user_role')
             }
-        elif template_type == 'marketing':
+        else:
+            ceSubject = _hash_subject(context.get('company_name'))
             data = {
                 'subscription_tier': context.get('subscription_tier'),
                 'customer_name': context.get('company_name'),
                 'marketing_team_email': context.get('marketing_team_email')
             }
-        else:
-            data = {
-                'template_type': template_type,
-                'customer_name': context.get('company_name'),
-                'user_email': context.get('user_email'),
-                'user_name': context.get('user_name')
-            }
         
-        # Create CloudEvents payload
-        cloud_event = {
-            'specversion': '1.0',
-            'type': event_type,
-            'source': 'knapscen.disco',
+        # id and time are stamped per event by _generate_cloud_event
+        return {
+            **self._ce_base[template_type],
             'subject': ceSubject,
-            'id': event_id,
-            'time': current_time,
+            'id': None,
+            'time': None,
             'datacontenttype': 'application/json',
             'data': data
         }
+    
+    def _generate_cloud_event(self, template_type: str, env: Optional[EnvSnapshot] = None) -> Dict[str, Any]:
+        """Generate a CloudEvents-compliant event payload."""
+        # Everything but id and time is fixed for a given environment, so the
+        # process-wide environment's events are built once per template
+        if env is None or env is self._env:
+            cloud_event = self._ce_cache.get(template_type)
+            if cloud_event is None:
+                cloud_event = self._ce_cache[template_type] = self._build_cloud_event(template_type, self._env)
+        else:
+            cloud_event = self._build_cloud_event(template_type, env)
+        
+        cloud_event = dict(cloud_event)
+        cloud_event['id'] = str(uuid.uuid4())[:8]
+        # Current timestamp; orjson serializes it as RFC 3339
+        cloud_event['time'] = datetime.now(timezone.utc)
         
         return cloud_event
 
-    async def publish_nats_event(self, template_type: str) -> bool:
+    async def _get_nc(self):
+        """Return the cached NATS connection, connecting on first use."""
+        import nats
+        
+        async with self._nc_lock:
+            if self._nc is None or self._nc.is_closed:
+                self._nc = await nats.connect(
+                    servers=[self.nats_server],
+                    user=self.nats_user,
+                    password=self.nats_password,
+                    allow_reconnect=True
+                )
+            return self._nc
+    
+    async def publish_nats_event(self, template_type: str, env: Optional[EnvSnapshot] = None) -> bool:
         """Publish CloudEvents-compliant event to NATS subject."""
         try:
             # Generate CloudEvents payload
-            event_data = self._generate_cloud_event(template_type)
+            event_data = self._generate_cloud_event(template_type, env)
             
-            # Connect to NATS and publish event
-            nc = await nats.connect(servers=[self.nats_server], user=self.nats_user, password=self.nats_password)
-            event_subject = os.getenv('NATS_SUBJECT')
+            # Publish event over the shared NATS connection; the client buffers
+            # writes, so flushing is left to flush()/close() at the end of a batch
+            nc = await self._get_nc()
+            event_subject = self.nats_subject
             
-            await nc.publish(event_subject, json.dumps(event_data).encode())
-            await nc.close()
+            await nc.publish(event_subject, orjson.dumps(event_data))
             
             logger.info(f"NATS event published to subject: {event_subject}")
             return True
@@ -244,9 +526,13 @@ class EmailNotificationService:
             logger.error(f"Failed to publish NATS event: {e}")
             return False
     
-    async def process_notification(self) -> bool:
-        """Process email notification based on environment variables."""
-        template_type = os.getenv('EMAIL_TEMPLATE')
+    async def process_notification(self, env: Optional[EnvSnapshot] = None) -> bool:
+        """Process email notification based on environment variables.
+        
+        env overrides the service's environment snapshot, e.g. for batch jobs.
+        """
+        env = self._env if env is None else env
+        template_type = env['EMAIL_TEMPLATE']
         
         if not template_type:
             logger.error("EMAIL_TEMPLATE environment variable not set")
@@ -254,24 +540,131 @@ class EmailNotificationService:
         
         logger.info(f"Processing {template_type} email notification")
         
-        # Send email
-        email_success = self.send_email(template_type)
-        if not email_success:
+        # Send email while the NATS connection is set up; the event reports a
+        # sent email, so it is only published once the send has succeeded
+        email_success, nc = await asyncio.gather(
+            self.send_email(template_type, env),
+            self._get_nc(),
+            return_exceptions=True
+        )
+        if email_success is not True:
             return False
         
         # Publish NATS event
-        event_success = await self.publish_nats_event(template_type)
+        if isinstance(nc, Exception):
+            logger.error(f"Failed to connect to NATS: {nc}")
+            event_success = False
+        else:
+            event_success = await self.publish_nats_event(template_type, env)
         if not event_success:
             logger.warning("Email sent but failed to publish NATS event")
         
         return email_success and event_success
+    
+    async def run_batch(self, jobs: Iterable[Optional[Dict[str, Any]]]) -> bool:
+        """Process a batch of notifications over the already-open connections.
+        
+        Each job maps template variables (e.g. USER_EMAIL) to values that
+        override the process environment for that notification only; None
+        stands for a job that couldn't be read and counts as a failure. Up to
+        SMTP_POOL_SIZE notifications are processed concurrently.
+        """
+        job_iter = iter(jobs)
+        read_lock = asyncio.Lock()
+        exhausted = object()
+        succeeded = failed = 0
+        
+        async def worker() -> None:
+            nonlocal succeeded, failed
+            while True:
+                # Pull jobs one at a time so a long-lived stdin pipe is streamed
+                # rather than drained up front; reads run in a thread since they
+                # may block, and the lock keeps them off the generator concurrently
+                async with read_lock:
+                    job = await asyncio.to_thread(next, job_iter, exhausted)
+                if job is exhausted:
+                    return
+                
+                if job is not None:
+                    overrides = {
+                        var: _job_env_value(value)
+                        for var, value in job.items() if var in JOB_VARS
+                    }
+                    if await self.process_notification({**self._env, **overrides}):
+                        succeeded += 1
+                        continue
+                failed += 1
+        
+        # If a worker fails, cancel the rest before re-raising so no send is
+        # still in flight when the caller closes the connections
+        workers = [asyncio.create_task(worker()) for _ in range(self.smtp_pool_size)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        await self.flush()
+        logger.info(f"Batch complete: {succeeded} succeeded, {failed} failed")
+        return failed == 0
+    
+    async def flush(self) -> None:
+        """Flush buffered NATS publishes and wait for the server to acknowledge them."""
+        if self._nc is not None and not self._nc.is_closed:
+            await self._nc.flush()
+    
+    async def close(self) -> None:
+        """Drain the NATS connection and close the pooled SMTP connections."""
+        if self._nc is not None and not self._nc.is_closed:
+            try:
+                await self._nc.drain()
+            except Exception as e:
+                logger.warning(f"Failed to drain NATS connection: {e}")
+        self._nc = None
+        
+        slots = [await self._smtp_pool.get() for _ in range(self.smtp_pool_size)]
+        for slot in slots:
+            if slot.connection is not None:
+                await asyncio.to_thread(self._close_smtp, slot.connection)
+            slot.connection, slot.msg_count = None, 0
+            self._smtp_pool.put_nowait(slot)
+
+
+def read_jobs(stream: BinaryIO) -> Iterator[Optional[Dict[str, Any]]]:
+    """Yield batch jobs from a binary JSON Lines stream.
+    
+    Lines are handed to orjson as bytes, so invalid UTF-8 is reported as a
+    malformed line rather than a decode error. Malformed lines are logged and
+    yielded as None so run_batch counts them as failed notifications.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            job = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Skipping malformed job on line {line_number}: {e}")
+            yield None
+            continue
+        if not isinstance(job, dict):
+            logger.error(f"Skipping job on line {line_number}: expected a JSON object")
+            yield None
+            continue
+        yield job
 
 
 async def main():
     """Main function to run the email notification service."""
     try:
         service = EmailNotificationService()
-        success = await service.process_notification()
+        try:
+            if service.batch_mode:
+                success = await service.run_batch(read_jobs(sys.stdin.buffer))
+            else:
+                success = await service.process_notification()
+        finally:
+            await service.close()
         
         if success:
             logger.info("Email notification service completed successfully")
@@ -286,4 +679,10 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # uvloop is optional; it speeds up the event loop when installed
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
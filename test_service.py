@@ -8,9 +8,42 @@ for the email notification service.
 
 import os
 import json
-import subprocess
+import email.message
 import sys
-from typing import Dict, Any
+import io
+import socket
+import asyncio
+import logging
+import smtplib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from email_notification_service import (
+    EmailNotificationService, PipeliningSMTP, _is_transient_smtp_error, read_jobs
+)
+
+# Keep the test SMTP server's per-command logging out of the test output
+logging.getLogger('mail.log').setLevel(logging.ERROR)
+
+
+# Connection settings shared by every scenario; template variables are
+# supplied per test as overrides of the service's environment snapshot
+BASE_ENV_VARS = {
+    'EMAIL_TEMPLATE': 'welcome',
+    'SMTP_SERVER': 'smtp.gmail.com',
+    'SMTP_PORT': '587',
+    'SMTP_USER': 'test@example.com',
+    'SMTP_PASS': 'test-password',
+    'NATS_SERVER': 'nats://localhost:4222',
+    'NATS_SUBJECT': 'email-notifications',
+    'NATS_USER': 'test-user',
+    'NATS_PASSWORD': 'test-password'
+}
+
+_service: Optional[EmailNotificationService] = None
 
 
 def set_env_vars(env_vars: Dict[str, str]) -> None:
@@ -19,6 +52,99 @@ def set_env_vars(env_vars: Dict[str, str]) -> None:
         os.environ[key] = value
 
 
+def check(condition: bool, description: str) -> bool:
+    """Print the outcome of a single check and return it."""
+    print(f"{'✅' if condition else '❌'} {description}")
+    return condition
+
+
+class SmtpTestHandler:
+    """aiosmtpd handler that advertises PIPELINING and records accepted mail.
+    
+    mail_replies holds statuses returned (in order) instead of accepting the
+    next MAIL commands; refused maps recipients to the status they are refused
+    with. With keep_refused, refused recipients still go into the envelope so
+    the server answers DATA with 354 instead of 503.
+    """
+    
+    def __init__(self):
+        self.mail_replies: List[str] = []
+        self.refused: Dict[str, str] = {}
+        self.keep_refused = False
+        self.messages: List[tuple] = []
+        self.peers = set()
+    
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        return responses[:-1] + ['250-PIPELINING'] + responses[-1:]
+    
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        self.peers.add(session.peer)
+        if self.mail_replies:
+            return self.mail_replies.pop(0)
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return '250 OK'
+    
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        status = self.refused.get(address)
+        if status is None or self.keep_refused:
+            envelope.rcpt_tos.append(address)
+        return status or '250 OK'
+    
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((list(envelope.rcpt_tos), envelope.content))
+        return '250 OK'
+
+
+# Welcome email overrides used by the SMTP server tests
+WELCOME_ENV_VARS = {
+    'EMAIL_TEMPLATE': 'welcome',
+    'USER_NAME': 'Alice',
+    'USER_EMAIL': 'alice@example.com',
+    'COMPANY_NAME': 'TechCorp',
+    'USER_ROLE': 'admin_user'
+}
+
+
+@contextmanager
+def smtp_test_server(handler: SmtpTestHandler) -> Iterator[int]:
+    """Run a local SMTP server that accepts any login; yields its port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    
+    controller = Controller(
+        handler, hostname='127.0.0.1', port=port,
+        authenticator=lambda *args: AuthResult(success=True),
+        auth_require_tls=False
+    )
+    controller.start()
+    try:
+        yield port
+    finally:
+        controller.stop()
+
+
+def get_smtp_service(port: int) -> EmailNotificationService:
+    """Return a fresh service pointed at the local test SMTP server."""
+    set_env_vars(BASE_ENV_VARS)
+    service = EmailNotificationService()
+    service.smtp_server = '127.0.0.1'
+    service.smtp_port = port
+    service.smtp_retry_delay = 0.01
+    return service
+
+
+def get_service() -> EmailNotificationService:
+    """Return a service shared across tests, built once from BASE_ENV_VARS."""
+    global _service
+    if _service is None:
+        set_env_vars(BASE_ENV_VARS)
+        _service = EmailNotificationService()
+    return _service
+
+
 def test_welcome_email():
     """Test the welcome email template."""
     print("🧪 Testing Welcome Email Template...")
@@ -28,28 +154,18 @@ def test_welcome_email():
         'USER_NAME': 'Alice Johnson',
         'USER_EMAIL': 'alice.johnson@techcorp.com',
         'COMPANY_NAME': 'TechCorp Solutions',
-        'USER_ROLE': 'admin_user',
-        'SMTP_SERVER': 'smtp.gmail.com',
-        'SMTP_PORT': '587',
-        'SMTP_USER': 'test@example.com',
-        'SMTP_PASS': 'test-password',
-        'NATS_SERVER': 'nats://localhost:4222',
-        'NATS_SUBJECT': 'email-notifications',
-        'NATS_USER': 'test-user',
-        'NATS_PASSWORD': 'test-password'
+        'USER_ROLE': 'admin_user'
     }
     
-    set_env_vars(env_vars)
-    
     try:
-        # Import and test the service
-        from email_notification_service import EmailNotificationService
+        # Test the shared service with this scenario's variables
+        service = get_service()
+        env = {**service._env, **env_vars}
         
-        service = EmailNotificationService()
-        context = service._get_template_context('welcome')
+        context = service._get_template_context('welcome', env)
         template_filename = service._get_template_filename('welcome')
         subject = service._get_email_subject('welcome')
-        recipient = service._get_recipient_email('welcome')
+        recipient = service._get_recipient_email('welcome', env)
         nats_subject = service._get_nats_event_subject('welcome')
         
         print(f"✅ Template context: {context}")
@@ -85,27 +201,17 @@ def test_marketing_notification():
         'EMAIL_TEMPLATE': 'marketing',
         'COMPANY_NAME': 'StartupXYZ Inc.',
         'MARKETING_TEAM_EMAIL': 'marketing@knapscen.com',
-        'USERS_JSON': json.dumps(users_data),
-        'SMTP_SERVER': 'smtp.gmail.com',
-        'SMTP_PORT': '587',
-        'SMTP_USER': 'test@example.com',
-        'SMTP_PASS': 'test-password',
-        'NATS_SERVER': 'nats://localhost:4222',
-        'NATS_SUBJECT': 'email-notifications',
-        'NATS_USER': 'test-user',
-        'NATS_PASSWORD': 'test-password'
+        'USERS_JSON': json.dumps(users_data)
     }
     
-    set_env_vars(env_vars)
-    
     try:
-        from email_notification_service import EmailNotificationService
+        service = get_service()
+        env = {**service._env, **env_vars}
         
-        service = EmailNotificationService()
-        context = service._get_template_context('marketing')
+        context = service._get_template_context('marketing', env)
         template_filename = service._get_template_filename('marketing')
         subject = service._get_email_subject('marketing')
-        recipient = service._get_recipient_email('marketing')
+        recipient = service._get_recipient_email('marketing', env)
         nats_subject = service._get_nats_event_subject('marketing')
         
         print(f"✅ Template context: {context}")
@@ -140,8 +246,7 @@ def test_environment_validation():
             del os.environ[var]
         
         try:
-            from email_notification_service import EmailNotificationService
-            service = EmailNotificationService()
+            EmailNotificationService()
             print(f"❌ Should have failed with missing {var}")
             return False
         except ValueError as e:
@@ -161,25 +266,11 @@ def test_invalid_template():
     """Test invalid template type."""
     print("\n🧪 Testing Invalid Template Type...")
     
-    env_vars = {
-        'EMAIL_TEMPLATE': 'invalid_template',
-        'SMTP_SERVER': 'smtp.gmail.com',
-        'SMTP_PORT': '587',
-        'SMTP_USER': 'test@example.com',
-        'SMTP_PASS': 'test-password',
-        'NATS_SERVER': 'nats://localhost:4222',
-        'NATS_SUBJECT': 'email-notifications',
-        'NATS_USER': 'test-user',
-        'NATS_PASSWORD': 'test-password'
-    }
-    
-    set_env_vars(env_vars)
-    
     try:
-        from email_notification_service import EmailNotificationService
+        service = get_service()
+        env = {**service._env, 'EMAIL_TEMPLATE': 'invalid_template'}
         
-        service = EmailNotificationService()
-        context = service._get_template_context('invalid_template')
+        service._get_template_context('invalid_template', env)
         print(f"❌ Should have failed with invalid template type")
         return False
     except ValueError as e:
@@ -194,6 +285,287 @@ def test_invalid_template():
         return False
 
 
+def test_smtp_pipelining():
+    """Test the pipelined SMTP envelope against a PIPELINING server."""
+    print("\n🧪 Testing SMTP Pipelining...")
+    
+    handler = SmtpTestHandler()
+    handler.refused = {'nobody@example.com': '550 No such user'}
+    results = []
+    
+    try:
+        with smtp_test_server(handler) as port:
+            server = PipeliningSMTP('127.0.0.1', port)
+            server.login('test@example.com', 'test-password')
+            results.append(check(server.has_extn('pipelining'), "Server advertises PIPELINING"))
+            
+            # Lines starting with a dot must be stuffed on the wire and arrive unchanged
+            body = "Subject: dots\r\n\r\n.leading dot\r\n..two dots\r\n.\r\nend\r\n"
+            server.sendmail('test@example.com', ['alice@example.com'], body)
+            delivered = handler.messages[-1][1].decode()
+            results.append(check(
+                delivered.endswith(".leading dot\r\n..two dots\r\n.\r\nend\r\n"),
+                "Dot-stuffed lines delivered intact"
+            ))
+            
+            # Some recipients refused: mail goes to the rest, refusals are returned
+            refused = server.sendmail('test@example.com', ['alice@example.com', 'nobody@example.com'], body)
+            results.append(check(
+                refused == {'nobody@example.com': (550, b'No such user')}
+                and handler.messages[-1][0] == ['alice@example.com'],
+                "Partially refused recipients reported, mail delivered to the rest"
+            ))
+            
+            # All recipients refused, server answers DATA with 503
+            try:
+                server.sendmail('test@example.com', ['nobody@example.com'], body)
+                results.append(check(False, "All recipients refused (503 on DATA) raises"))
+            except smtplib.SMTPRecipientsRefused:
+                results.append(check(True, "All recipients refused (503 on DATA) raises"))
+            
+            # All recipients refused, server answers DATA with 354 anyway
+            handler.keep_refused = True
+            try:
+                server.sendmail('test@example.com', ['nobody@example.com'], body)
+                results.append(check(False, "All recipients refused (354 on DATA) raises"))
+            except smtplib.SMTPRecipientsRefused:
+                results.append(check(True, "All recipients refused (354 on DATA) raises"))
+            handler.keep_refused = False
+            
+            # The session must still be in sync after both failures
+            count = len(handler.messages)
+            server.sendmail('test@example.com', ['alice@example.com'], body)
+            results.append(check(len(handler.messages) == count + 1, "Connection usable after refusals"))
+            server.quit()
+            
+            # 421 closes the connection; the service reconnects and retries
+            handler.mail_replies = ['421 Service shutting down']
+            handler.peers.clear()
+            service = get_smtp_service(port)
+            env = {**service._env, **WELCOME_ENV_VARS}
+            
+            async def send_after_421() -> bool:
+                try:
+                    return await service.send_email('welcome', env)
+                finally:
+                    await service.close()
+            
+            sent = asyncio.run(send_after_421())
+            results.append(check(
+                sent and len(handler.peers) == 2 and handler.messages[-1][0] == ['alice@example.com'],
+                "421 closes the connection and the send succeeds on a new one"
+            ))
+    except Exception as e:
+        print(f"❌ SMTP pipelining test failed: {e}")
+        return False
+    
+    return all(results)
+
+
+def test_email_content():
+    """Test the MIME message delivered for a rendered template."""
+    print("\n🧪 Testing Email Content...")
+    
+    handler = SmtpTestHandler()
+    
+    try:
+        with smtp_test_server(handler) as port:
+            service = get_smtp_service(port)
+            plain_env = {**service._env, **WELCOME_ENV_VARS}
+            # The templates are ASCII; non-ASCII user data takes the base64 path
+            utf8_env = {**plain_env, 'USER_NAME': 'Zoë Müller', 'COMPANY_NAME': 'Café Ltd'}
+            
+            def render(env: Dict[str, Optional[str]]) -> str:
+                return service._templates['welcome'].render(**service._get_template_context('welcome', env))
+            
+            async def send(env: Dict[str, Optional[str]]) -> email.message.Message:
+                await service.send_email('welcome', env)
+                return email.message_from_bytes(handler.messages[-1][1])
+            
+            async def send_both() -> list:
+                try:
+                    return [await send(utf8_env), await send(plain_env)]
+                finally:
+                    await service.close()
+            
+            utf8, plain = asyncio.run(send_both())
+            utf8_html, plain_html = render(utf8_env), render(plain_env)
+    except Exception as e:
+        print(f"❌ Email content test failed: {e}")
+        return False
+    
+    results = [
+        check(utf8['From'] == BASE_ENV_VARS['SMTP_USER'] and utf8['To'] == 'alice@example.com'
+              and utf8['Subject'] == 'Welcome to Knapscen!', "From, To and Subject headers set"),
+        check(utf8.get_content_type() == 'text/html' and utf8.get_content_charset() == 'utf-8',
+              "Content type is text/html with charset=utf-8"),
+        check(not utf8_html.isascii() and utf8['Content-Transfer-Encoding'] == 'base64'
+              and utf8.get_payload(decode=True).decode('utf-8') == utf8_html,
+              "Non-ASCII body sent as base64 and decodes to the rendered HTML"),
+        check(plain_html.isascii() and plain['Content-Transfer-Encoding'] == '7bit'
+              and plain.get_payload().replace('\r\n', '\n').rstrip('\n') == plain_html.rstrip('\n'),
+              "ASCII body sent as 7bit")
+    ]
+    return all(results)
+
+
+def test_smtp_connection_recycling():
+    """Test that pooled SMTP connections are recycled after the message cap."""
+    print("\n🧪 Testing SMTP Connection Recycling...")
+    
+    handler = SmtpTestHandler()
+    
+    try:
+        with smtp_test_server(handler) as port:
+            service = get_smtp_service(port)
+            service.smtp_max_messages_per_conn = 2
+            env = {**service._env, **WELCOME_ENV_VARS}
+            
+            async def send_three() -> list:
+                try:
+                    return [await service.send_email('welcome', env) for _ in range(3)]
+                finally:
+                    await service.close()
+            
+            sent = asyncio.run(send_three())
+    except Exception as e:
+        print(f"❌ SMTP connection recycling test failed: {e}")
+        return False
+    
+    results = [
+        check(all(sent) and len(handler.messages) == 3, "All messages delivered"),
+        check(len(handler.peers) == 2, "Connection recycled after 2 messages")
+    ]
+    return all(results)
+
+
+def test_smtp_retry():
+    """Test transient SMTP error classification and retrying."""
+    print("\n🧪 Testing SMTP Retry...")
+    
+    results = [
+        check(_is_transient_smtp_error(smtplib.SMTPSenderRefused(421, b'Try later', 'a@example.com')),
+              "421 is transient"),
+        check(_is_transient_smtp_error(smtplib.SMTPDataError(451, b'Local error')),
+              "451 is transient"),
+        check(not _is_transient_smtp_error(smtplib.SMTPSenderRefused(550, b'Rejected', 'a@example.com')),
+              "550 is permanent"),
+        check(not _is_transient_smtp_error(smtplib.SMTPDataError(554, b'Transaction failed')),
+              "554 is permanent"),
+        check(_is_transient_smtp_error(smtplib.SMTPRecipientsRefused({
+            'a@example.com': (450, b'Mailbox busy'), 'b@example.com': (452, b'Too many recipients')
+        })), "All recipients refused with 4xx is transient"),
+        check(not _is_transient_smtp_error(smtplib.SMTPRecipientsRefused({
+            'a@example.com': (450, b'Mailbox busy'), 'b@example.com': (550, b'No such user')
+        })), "Any recipient refused with 5xx is permanent"),
+        check(not _is_transient_smtp_error(smtplib.SMTPServerDisconnected()),
+              "Disconnect without a reply code is not retried")
+    ]
+    
+    handler = SmtpTestHandler()
+    
+    try:
+        with smtp_test_server(handler) as port:
+            service = get_smtp_service(port)
+            env = {**service._env, **WELCOME_ENV_VARS}
+            
+            async def send(mail_replies: list) -> tuple:
+                # Also report how many of the queued MAIL replies went unused
+                handler.mail_replies = list(mail_replies)
+                return await service.send_email('welcome', env), len(handler.mail_replies)
+            
+            async def send_all() -> list:
+                try:
+                    return [
+                        await send(['451 Try again later']),
+                        await send(['550 Rejected', '250 OK']),
+                        await send(['451 Try again later'] * (service.smtp_max_retries + 1))
+                    ]
+                finally:
+                    await service.close()
+            
+            retried, permanent, exhausted = asyncio.run(send_all())
+    except Exception as e:
+        print(f"❌ SMTP retry test failed: {e}")
+        return False
+    
+    results += [
+        check(retried == (True, 0) and len(handler.messages) == 1, "Send retried after 451 and delivered"),
+        check(permanent == (False, 1), "Send not retried after 550"),
+        check(exhausted == (False, 0) and len(handler.messages) == 1, "Send fails once retries are exhausted")
+    ]
+    return all(results)
+
+
+def test_batch_mode():
+    """Test reading batch jobs and running them."""
+    print("\n🧪 Testing Batch Mode...")
+    
+    stream = io.BytesIO(
+        b'{"EMAIL_TEMPLATE": "welcome", "USER_NAME": "Alice", "NEXT_ACTIONS": null}\n'
+        b'\n'
+        b'{not json\n'
+        b'["not", "an", "object"]\n'
+        b'{"USER_EMAIL": "a@example.com"}\xff\xfe\n'
+        b'{"EMAIL_TEMPLATE": "marketing", "NEXT_ACTIONS": ["Review"], "UNKNOWN": "x"}\n'
+    )
+    jobs = list(read_jobs(stream))
+    results = [
+        check(len(jobs) == 5, "Blank lines skipped"),
+        check(jobs[1:4] == [None, None, None], "Malformed, non-object and invalid UTF-8 lines yielded as None")
+    ]
+    
+    try:
+        service = get_service()
+        seen = []
+        
+        async def process_notification(env=None) -> bool:
+            seen.append(env)
+            return env['EMAIL_TEMPLATE'] == 'welcome'
+        
+        # Replace the per-job work so only the batch bookkeeping is exercised
+        service.process_notification = process_notification
+        succeeded = asyncio.run(service.run_batch(jobs))
+        seen.sort(key=lambda env: env['EMAIL_TEMPLATE'], reverse=True)
+    except Exception as e:
+        print(f"❌ Batch mode test failed: {e}")
+        return False
+    
+    results += [
+        check(len(seen) == 2, "Only readable jobs processed"),
+        check(seen[0]['USER_NAME'] == 'Alice' and seen[0]['NEXT_ACTIONS'] is None,
+              "Job values override the environment and null unsets a variable"),
+        check(seen[1]['NEXT_ACTIONS'] == '["Review"]' and 'UNKNOWN' not in seen[1],
+              "Lists passed JSON-encoded and unknown keys ignored"),
+        check(seen[1]['SMTP_SERVER'] == BASE_ENV_VARS['SMTP_SERVER'], "Unset job values fall back to the environment"),
+        check(succeeded is False, "Batch reports failure for failed and unreadable jobs")
+    ]
+    
+    # A failing job stream must stop the other workers before run_batch raises
+    cancelled = []
+    
+    async def slow_notification(env=None) -> bool:
+        try:
+            await asyncio.sleep(10)
+            return True
+        except asyncio.CancelledError:
+            cancelled.append(env)
+            raise
+    
+    def failing_jobs():
+        yield {}
+        raise OSError("stdin closed")
+    
+    service.process_notification = slow_notification
+    try:
+        asyncio.run(service.run_batch(failing_jobs()))
+        results.append(check(False, "Batch error re-raised after cancelling in-flight jobs"))
+    except OSError:
+        results.append(check(len(cancelled) == 1, "Batch error re-raised after cancelling in-flight jobs"))
+    
+    return all(results)
+
+
 def run_all_tests():
     """Run all test scenarios."""
     print("🚀 Starting Email Notification Service Tests\n")
@@ -202,7 +574,12 @@ def run_all_tests():
         test_environment_validation,
         test_welcome_email,
         test_marketing_notification,
-        test_invalid_template
+        test_invalid_template,
+        test_smtp_pipelining,
+        test_email_content,
+        test_smtp_connection_recycling,
+        test_smtp_retry,
+        test_batch_mode
     ]
     
     passed = 0